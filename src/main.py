@@ -1,17 +1,24 @@
 #!/usr/bin/python3
 from argparse import *
 from ctypes import CFUNCTYPE, c_int
-from os import remove
-from sys import platform
+from sys import platform, stdout
 from os.path import splitext, exists
+from pathlib import Path
 from pile import *
 import subprocess
 
 # VERSION = (0, 0, 0)
 # STR_VERSION = '.'.join(str(i) for i in VERSION)
 
+_TOKENKIND_NAME: Dict[TokenKind, str] = {
+    TokenKind.Word: "word",
+    TokenKind.Int: "integer",
+    TokenKind.Float: "float",
+    TokenKind.String: "string",
+}
 
-def parse_args() -> Namespace:
+
+def build_parser() -> ArgumentParser:
     p = ArgumentParser("pile",
                        description="Pile Programming Language",
                        epilog="Copyright © 2023 Marcio Dantas. "
@@ -36,7 +43,10 @@ def parse_args() -> Namespace:
         action="store_true",
         help="prints the compiled LLVM representation of given file"
     )
-    return p.parse_args()
+    return p
+
+
+_PARSER = build_parser()
 
 
 def pile2llvm(path: str) -> ir.Module:
@@ -45,16 +55,12 @@ def pile2llvm(path: str) -> ir.Module:
 
 
 def dump_tokens(path: str) -> None:
-    format_tokenkind = (lambda tk: {
-        TokenKind.Word: "word",
-        TokenKind.Int: "integer",
-        TokenKind.Float: "float",
-        TokenKind.String: "string",
-    }.get(tk, "token"))
+    out = []
     for i in lex_file(path):
         f, r, c = i.position
-        print(
-            f"{format_tokenkind(i.kind)} `{i.value}` at file \"{f}\", row {r} col {c}")
+        out.append(f"{_TOKENKIND_NAME.get(i.kind, 'token')} `{i.value}` "
+                   f"at file \"{f}\", row {r} col {c}\n")
+    stdout.write("".join(out))
 
 
 def err(msg: str) -> None:
@@ -65,24 +71,29 @@ def err(msg: str) -> None:
 def compile_to_executable(filename: str, output: str) -> None:
     if output is None:
         output = filename
-    llvm_path = f"{splitext(output)[0]}.ll"
-    with open(llvm_path, "w") as llvm_f:
-        llvm_f.write(str(pile2llvm(filename)))
-    subprocess.call(["clang", llvm_path, "-o", splitext(output)[0]])
-    remove(llvm_path)
+    result = subprocess.run(
+        ["clang", "-x", "ir", "-o", splitext(output)[0], "-"],
+        input=str(pile2llvm(filename)),
+        text=True
+    )
+    if result.returncode != 0:
+        err(f"clang exited with code {result.returncode}")
 
 
 def compile_mcjit(mod: ir.Module) -> binding.ExecutionEngine:
-    target = binding.Target.from_default_triple()
-    target = target.create_target_machine()
     module = binding.parse_assembly(str(mod))
-    engine = binding.create_mcjit_compiler(module, target)
+    pmb = binding.create_pass_manager_builder()
+    pmb.opt_level = 2
+    pm = binding.create_module_pass_manager()
+    pmb.populate(pm)
+    pm.run(module)
+    engine = binding.create_mcjit_compiler(module, TARGET_MACHINE)
     engine.finalize_object()
     return engine
 
 
 def main() -> None:
-    args = parse_args()
+    args = _PARSER.parse_args()
     if not exists(args.filename):
         err(f"no such file \"{args.filename}\"")
 
@@ -90,8 +101,7 @@ def main() -> None:
         if args.output is None:
             print(pile2llvm(args.filename))
         else:
-            with open(args.output, "w") as f:
-                f.write(str(pile2llvm(args.filename)))
+            Path(args.output).write_text(str(pile2llvm(args.filename)))
     elif args.compile:
         if platform == "win32":
             err("the ability to compile a program to an executable is not supported on Windows systems YET")
@@ -1,14 +1,23 @@
+import re
+import textwrap
 from dataclasses import dataclass
 from enum import Enum, auto
+from itertools import count
 from llvmlite import ir, binding
 from sys import stderr
 from typing import Callable, TextIO, List
-from typing import Dict, Iterable, Tuple
+from typing import Dict, Iterable, Optional, Tuple
 
 I32: ir.IntType = ir.IntType(32)
 BOOL: ir.IntType = ir.IntType(1)
 FLOAT: ir.FloatType = ir.FloatType()
 DOUBLE: ir.DoubleType = ir.DoubleType()
+IR_TYPE_NAMES: Dict[ir.Type, str] = {
+    I32: "integer",
+    FLOAT: "float",
+    BOOL: "bool",
+    ir.PointerType(ir.IntType(8)): "string",
+}
 
 
 class TokenKind(Enum):
@@ -29,53 +38,39 @@ class Token:
 # https://youtube.com/clip/Ugkx0EDLNMP4aS5yHNxqmHehqQ6iYG3OCOSC
 
 
-def find_col(string: str, col: int, pred: Callable) -> int:
-    while col < len(string) and not pred(string[col]):
-        col += 1
-    return col
+# TODO: Report unterminated and unstarted strings
+# (an unterminated string currently runs to the end of the line)
+_TOKEN_RE = re.compile(r'"([^"]*)"?|(\S+)')
 
 
 def lex_line(line: str) -> Iterable[Tuple[int, str, TokenKind]]:
-    col = find_col(line, 0, lambda x: not x.isspace())
-    line = line.split("//")[0]
-    while col < len(line):
-        if line[col] == '"':
-            # TODO: Report unterminated and unstarted strings
-            end = find_col(line, col + 1, lambda x: x == '"')
-            yield col, line[col + 1:end], TokenKind.String
-            col = find_col(line, end + 1, lambda x: not x.isspace())
+    string_kind = TokenKind.String
+    for m in _TOKEN_RE.finditer(line.partition("//")[0]):
+        string, word = m.groups()
+        if string is not None:
+            yield m.start(), string, string_kind
         else:
-            end = find_col(line, col, lambda x: x.isspace())
-            token = line[col:end]
-            yield col, line[col:end], classify_token(token)
-            col = find_col(line, end, lambda x: not x.isspace())
+            yield m.start(), word, classify_token(word)
 
 
 def lex_file(path: str) -> Iterable[Token]:
     with open(path, "r") as f:
-        yield from (
-            Token(val, kind, (path, row + 1, col))
-            for row, x in enumerate(f.readlines())
-            for col, val, kind in lex_line(x)
-        )
-
-
-def is_cls(cls: type, text: str) -> bool:
-    try:
-        cls(text)
-    except ValueError:
-        return False
-    else:
-        return True
+        for row, line in enumerate(f, 1):
+            for col, val, kind in lex_line(line):
+                yield Token(val, kind, (path, row, col))
+
+
+_INT_RE = re.compile(r"[+-]?\d+\Z")
+_FLOAT_RE = re.compile(r"[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?\Z")
 
 
 def classify_token(token: str) -> TokenKind:
-    if is_cls(int, token):
+    if token[:1] == '"':
+        return TokenKind.String
+    elif _INT_RE.match(token):
         return TokenKind.Int
-    elif is_cls(float, token):
+    elif _FLOAT_RE.match(token):
         return TokenKind.Float
-    elif token.startswith('"'):
-        return TokenKind.String
     return TokenKind.Word
 
 
@@ -113,105 +108,131 @@ def match_kind(token: Token) -> NodeKind:
             "match_kind isn't handling all TokenKind variants")
 
 
-def check_op(virtual_stack: List[str],
+T_INT, T_FLOAT, T_STRING, T_BOOL = 1, 2, 4, 8
+DISCARD = 0
+TYPE_NAMES: Dict[int, str] = {
+    T_INT: "integer",
+    T_FLOAT: "float",
+    T_STRING: "string",
+    T_BOOL: "bool",
+}
+
+
+def format_expected(expected: Tuple[int, int]) -> str:
+    accepted, arity = expected
+    return " or ".join(
+        f"({', '.join(name for _ in range(arity))})"
+        for typ, name in TYPE_NAMES.items()
+        if typ & accepted
+    )
+
+
+def check_op(virtual_stack: List[int],
              token: Token,
-             expected: List[Tuple[str, int]],
-             ret_type: str = None,
+             expected: Tuple[int, int],
+             ret_type: int = None,
              lossy: int = 0) -> None:
-    if len(virtual_stack) < expected[0][1]:
+    accepted, arity = expected
+    if len(virtual_stack) < arity:
         throw(token.position,
               "stack underflow",
-              f"`{token.value}` operation needs {expected[0][1]} "
-              f"stack value{'s' if expected[0][1] > 1 else ''} to be "
+              f"`{token.value}` operation needs {arity} "
+              f"stack value{'s' if arity > 1 else ''} to be "
               f"performed but got {len(virtual_stack) if virtual_stack else 'no'} values")
 
-    values = tuple(virtual_stack.pop() for _ in range(expected[0][1]))
+    values = virtual_stack[:-arity - 1:-1]
+    del virtual_stack[-arity:]
 
-    expected_cmp = [
-        tuple(expect[0] for _ in range(expect[1]))
-        for expect in expected
-    ]
-
-    if values not in expected_cmp:
-        expected_str = " or ".join(
-            f"({', '.join(i[0] for _ in range(i[1]))})"
-            for i in expected
-        )
+    # Every operand must have the same type, i.e. exactly one bit
+    # set, and that type must be one the operation accepts.
+    found = 0
+    for value in values:
+        found |= value
+    if found & (found - 1) or not found & accepted:
         throw(token.position, "type mismatch",
               f"`{token.value}` operation got mismatched type"
-              f"{'s' if expected[0][1] > 1 else ''} "
-              f"({', '.join(values)}) but operation expects {expected_str}")
+              f"{'s' if arity > 1 else ''} "
+              f"({', '.join(TYPE_NAMES[i] for i in values)}) "
+              f"but operation expects {format_expected(expected)}")
     if ret_type is None:
-        if lossy == 0:
-            virtual_stack.append(values[0])
-        else:
-            virtual_stack.extend([values[0] for _ in range(lossy)])
-    elif ret_type != "_":
+        ret_type = found
+    if ret_type != DISCARD:
         if lossy == 0:
             virtual_stack.append(ret_type)
         else:
-            virtual_stack.extend([ret_type for _ in range(lossy)])
+            virtual_stack.extend([ret_type] * lossy)
+
+
+TEROP = (T_INT | T_FLOAT, 3)
+BINOP = (T_INT | T_FLOAT, 2)
+UNOP = (T_INT | T_FLOAT | T_STRING | T_BOOL, 1)
+# operation -> (expected operands, ret_type, lossy) arguments of check_op
+PARSE_OPS: Dict[str, Tuple[Tuple[int, int], Optional[int], int]] = {
+    "+": (BINOP, None, 0),
+    "-": (BINOP, None, 0),
+    "*": (BINOP, None, 0),
+    "/": (BINOP, None, 0),
+    "%": (BINOP, None, 0),
+    ">": (BINOP, T_BOOL, 0),
+    "<": (BINOP, T_BOOL, 0),
+    ">=": (BINOP, T_BOOL, 0),
+    "<=": (BINOP, T_BOOL, 0),
+    "!=": (BINOP, T_BOOL, 0),
+    "=": (BINOP, T_BOOL, 0),
+    "|": ((T_INT | T_BOOL, 2), None, 0),
+    "&": ((T_INT | T_BOOL, 2), None, 0),
+    ">>": ((T_INT, 2), None, 0),
+    "<<": ((T_INT, 2), None, 0),
+    "!": (UNOP, None, 0),
+    "drop": (UNOP, DISCARD, 0),
+    "dup": (UNOP, None, 2),
+    "swap": (BINOP, None, 2),
+    "over": (BINOP, None, 3),
+    "rot": (TEROP, None, 3),
+    "dump": (UNOP, DISCARD, 0),
+}
 
 
 def parse(tokens: Iterable[Token]) -> Program:
-    types: List[str] = []
+    types: List[int] = []
     blocks: List[str] = []
-    terop = [("integer", 3),
-             ("float", 3)]
-    binop = [("integer", 2),
-             ("float", 2)]
-    unop = [("integer", 1),
-            ("float", 1),
-            ("string", 1),
-            ("bool", 1)]
-    ops: Dict[str, Callable] = {
-        "+": lambda t: check_op(types, t, binop),
-        "-": lambda t: check_op(types, t, binop),
-        "*": lambda t: check_op(types, t, binop),
-        "/": lambda t: check_op(types, t, binop),
-        "%": lambda t: check_op(types, t, binop),
-        ">": lambda t: check_op(types, t, binop, "bool"),
-        "<": lambda t: check_op(types, t, binop, "bool"),
-        ">=": lambda t: check_op(types, t, binop, "bool"),
-        "<=": lambda t: check_op(types, t, binop, "bool"),
-        "!=": lambda t: check_op(types, t, binop, "bool"),
-        "=": lambda t: check_op(types, t, binop, "bool"),
-        "|": lambda t: check_op(types, t, [("integer", 2), ("bool", 2)]),
-        "&": lambda t: check_op(types, t, [("integer", 2), ("bool", 2)]),
-        ">>": lambda t: check_op(types, t, [("integer", 2)]),
-        "<<": lambda t: check_op(types, t, [("integer", 2)]),
-        "!": lambda t: check_op(types, t, unop),
-        "drop": lambda t: check_op(types, t, unop, "_"),
-        "dup": lambda t: check_op(types, token, unop, lossy=2),
-        "swap": lambda t: check_op(types, t, binop, lossy=2),
-        "over": lambda t: check_op(types, t, binop, lossy=3),
-        "rot": lambda t: check_op(types, t, terop, lossy=3),
-        "dump": lambda t: check_op(types, t, unop, "_"),
-    }
+    # types as they were when each open `if` was entered: the `else`
+    # branch starts from that stack, not from where `if` left off
+    branches: List[List[int]] = []
+    # types as they were right after each open `do`: leaving a loop
+    # resumes from that stack, like the compiled code does
+    loops: List[List[int]] = []
+    push = types.append
+    int_kind, float_kind = TokenKind.Int, TokenKind.Float
+    string_kind = TokenKind.String
     for token in tokens:
-        if token.kind == TokenKind.Int:
-            types.append("integer")
-        elif token.kind == TokenKind.Float:
-            types.append("float")
-        elif token.kind == TokenKind.String:
-            types.append("string")
-        elif token.value == "if":
-            check_op(types, token, [("bool", 1)], "_")
+        kind = token.kind
+        value = token.value
+        if kind == int_kind:
+            push(T_INT)
+        elif kind == float_kind:
+            push(T_FLOAT)
+        elif kind == string_kind:
+            push(T_STRING)
+        elif value == "if":
+            check_op(types, token, (T_BOOL, 1), DISCARD)
             blocks.append("if")
-        elif token.value == "while":
+            branches.append(types[:])
+        elif value == "while":
             blocks.append("while")
-        elif token.value == "else":
+        elif value == "else":
             if blocks:
                 block = blocks[-1]
                 if block != "if":
                     throw(token.position, "syntax error",
                           f"`{block}` block does not support else")
+                types[:] = branches[-1]
             else:
                 throw(token.position,
                       "syntax error",
                       "started `else` block without a proper beginning.")
-        elif token.value == "do":
-            check_op(types, token, [("bool", 1)], "_")
+        elif value == "do":
+            check_op(types, token, (T_BOOL, 1), DISCARD)
             if blocks:
                 block = blocks.pop()
                 if block != "while":
@@ -223,13 +244,18 @@ def parse(tokens: Iterable[Token]) -> Program:
                       "syntax error",
                       "started `do` block without `while` first")
             blocks.append("do")
-        elif token.value == "end":
+            loops.append(types[:])
+        elif value == "end":
             if not blocks:
                 throw(token.position, "syntax error",
                       "block ended without a beginning")
-            blocks.pop()
-        elif token.value in ops:
-            ops[token.value](token)
+            block = blocks.pop()
+            if block == "if":
+                branches.pop()
+            elif block == "do":
+                types[:] = loops.pop()
+        elif value in PARSE_OPS:
+            check_op(types, token, *PARSE_OPS[value])
         yield Node(token, match_kind(token))
     if blocks:
         throw(token.position, "syntax error",
@@ -246,8 +272,10 @@ def parse(tokens: Iterable[Token]) -> Program:
 binding.initialize()
 binding.initialize_native_target()
 binding.initialize_native_asmprinter()
+TARGET_MACHINE = binding.Target.from_default_triple().create_target_machine()
 module = ir.Module(name="pile")
 module.triple = binding.get_default_triple()
+module.data_layout = str(TARGET_MACHINE.target_data)
 main_fn = ir.Function(
     module,
     ir.FunctionType(ir.IntType(32), []),
@@ -259,7 +287,9 @@ merge_block = entry
 stack: list = []
 conditionals: list = []
 FUNCTIONS: Dict[str, ir.Function] = {}
-CONSTS: Dict[str, ir.GlobalVariable] = {}
+CONSTS: Dict[bytes, ir.GlobalVariable] = {}
+SLOTS: Dict[Tuple[int, ir.Type], ir.AllocaInstr] = {}
+GLOBAL_IDS = count()
 
 
 @dataclass
@@ -275,6 +305,8 @@ class If(Cond):
     false: ir.Block
     merge: ir.Block
     has_else: bool
+    snapshot: list
+    types: list
 
 
 @dataclass
@@ -283,50 +315,65 @@ class While(Cond):
     false: ir.Block
     merge: ir.Block
     cmp_return: ir.Block
+    snapshot: list
+    types: list
 
 
 def compile_program(prog: Program) -> ir.Module:
-    ops: Dict[str, Callable] = {
-        "+": add, "-": sub,
-        "*": mul, "/": div,
-        "%": mod, ">": gt,
-        "<": lt, ">=": ge,
-        "<=": le, "!=": ne,
-        "=": eq, "|": bor,
-        "&": band, ">>": shr,
-        "<<": shl, "!": not_, "dup": dup,
-        "drop": drop, "over": over,
-        "rot": rot, "swap": swap,
-        "dump": dump, "if": start_cond,
-        "else": else_cond, "while": start_loop,
-        "do": do_loop, "end": end_cond,
-    }
+    ops = COMPILE_OPS
+    int_kind, float_kind = NodeKind.Int, NodeKind.Float
+    string_kind = NodeKind.String
     for node in prog:
-        if node.kind == NodeKind.Int:
-            ipush(int(node.token.value))
-        elif node.kind == NodeKind.Float:
-            fpush(float(node.token.value))
-        elif node.kind == NodeKind.String:
-            spush(node.token.value)
-        elif node.token.value in ops:
-            action = ops[node.token.value]
-            action()
+        kind = node.kind
+        value = node.token.value
+        if kind == int_kind:
+            ipush(int(value))
+        elif kind == float_kind:
+            fpush(float(value))
+        elif kind == string_kind:
+            spush(value)
+        elif value == "end":
+            end_cond(node.token)
+        elif value in ops:
+            ops[value]()
         else:
             throw(node.token.position,
                   "word error",
                   "unknown operation or defined "
-                  f"identifier `{node.token.value}`")
+                  f"identifier `{value}`")
     ret(0)
     return module
 
 
+# The stack lives in Python as a list of SSA values. Values only need
+# to go through memory where control flow joins (the end of an if/else
+# and the top of a while loop): there, the stack is spilled into one
+# slot per depth, allocated at the entry block so mem2reg can promote it.
+def stack_slot(depth: int, typ: ir.Type) -> ir.AllocaInstr:
+    if (depth, typ) not in SLOTS:
+        with builder.goto_entry_block():
+            SLOTS[depth, typ] = builder.alloca(typ)
+    return SLOTS[depth, typ]
+
+
+def spill() -> list:
+    for depth, value in enumerate(stack):
+        builder.store(value, stack_slot(depth, value.type))
+    return [value.type for value in stack]
+
+
+def reload(types: list) -> None:
+    stack[:] = [builder.load(stack_slot(depth, typ))
+                for depth, typ in enumerate(types)]
+
+
 def start_cond() -> None:
-    cmp = builder.load(stack.pop())
+    cmp = stack.pop()
     true = main_fn.append_basic_block("if")
     false = main_fn.append_basic_block("else")
     merge = main_fn.append_basic_block("end")
     builder.cbranch(cmp, true, false)
-    conditionals.append(If(true, false, merge, False))
+    conditionals.append(If(true, false, merge, False, stack[:], []))
     builder.position_at_end(true)
 
 
@@ -334,14 +381,17 @@ def start_loop() -> None:
     cmp_return = main_fn.append_basic_block("while")
     true = main_fn.append_basic_block("do")
     merge = main_fn.append_basic_block("end")
-    conditionals.append(While(true, merge, merge, cmp_return))
+    types = spill()
+    conditionals.append(While(true, merge, merge, cmp_return, [], types))
     builder.branch(cmp_return)
     builder.position_at_end(cmp_return)
+    reload(types)
 
 
 def do_loop() -> None:
-    cmp = builder.load(stack.pop())
+    cmp = stack.pop()
     cond = conditionals[-1]
+    cond.snapshot = stack[:]
     builder.cbranch(cmp, cond.true, cond.merge)
     builder.position_at_end(cond.true)
 
@@ -349,229 +399,238 @@ def do_loop() -> None:
 def else_cond() -> None:
     cond = conditionals[-1]
     cond.has_else = True
+    cond.types = spill()
     builder.branch(cond.merge)
     builder.position_at_end(cond.false)
+    stack[:] = cond.snapshot
 
 
-def end_cond() -> None:
+def check_join(token: Token,
+               expected: list, expected_at: str,
+               got: list, got_at: str,
+               note: str = None) -> None:
+    if got == expected:
+        return
+    throw(token.position,
+          "stack mismatch" if len(got) != len(expected) else "type mismatch",
+          f"{got_at} ends with ({', '.join(map(IR_TYPE_NAMES.get, got))}) "
+          f"but {expected_at} ({', '.join(map(IR_TYPE_NAMES.get, expected))})",
+          note)
+
+
+def end_cond(token: Token) -> None:
     cond = conditionals.pop()
     if isinstance(cond, If):
+        types = spill()
+        if cond.has_else:
+            check_join(token, cond.types, "the `if` branch ends with",
+                       types, "the `else` branch")
+        else:
+            check_join(token, [value.type for value in cond.snapshot],
+                       "the stack before it was", types, "the `if` branch",
+                       "an `if` without `else` must leave the stack "
+                       "as it found it")
         builder.branch(cond.merge)
         if not cond.has_else:
             builder.position_at_end(cond.false)
+            stack[:] = cond.snapshot
+            spill()
             builder.branch(cond.merge)
         builder.position_at_end(cond.merge)
+        reload(types)
     elif isinstance(cond, While):
+        check_join(token, cond.types, "the loop started with",
+                   spill(), "the loop body",
+                   "a `while` body must leave the stack as it found it")
         builder.branch(cond.cmp_return)
         builder.position_at_end(cond.merge)
+        stack[:] = cond.snapshot
 
 
 def ipush(value: int) -> None:
-    stack.append(builder.alloca(I32))
-    builder.store(ir.Constant(I32, value), stack[-1])
+    stack.append(ir.Constant(I32, value))
 
 
 def fpush(value: float) -> None:
-    stack.append(builder.alloca(FLOAT))
-    builder.store(ir.Constant(FLOAT, value), stack[-1])
+    stack.append(ir.Constant(FLOAT, value))
 
 
 def spush(value: str) -> None:
-    byte_value = bytearray(bytes(value, "utf-8"))
-    name = f".{len(CONSTS)}"
-    if name not in CONSTS:
-        CONSTS[name] = global_str(byte_value)
-    stack.append(builder.alloca(ir.PointerType(ir.IntType(8))))
-    string = builder.bitcast(CONSTS[name], ir.PointerType(ir.IntType(8)))
-    builder.store(string, stack[-1])
+    string = builder.bitcast(global_const(bytes(value, "utf-8")),
+                             ir.PointerType(ir.IntType(8)))
+    stack.append(string)
 
 
 def dup() -> None:
-    a = builder.load(stack[-1])
-    stack.append(builder.alloca(a.type))
-    builder.store(a, stack[-1])
+    stack.append(stack[-1])
 
 
 def drop() -> None:
-    # Just ignore value. I didn't find
-    # any way to undo the alloca intruction :(
     stack.pop()
 
 
 def over() -> None:
-    a = builder.load(stack[-2])
-    stack.append(builder.alloca(a.type))
-    builder.store(a, stack[-1])
+    stack.append(stack[-2])
 
 
 def swap() -> None:
-    a = builder.load(stack.pop(-2))
-    stack.append(builder.alloca(a.type))
-    builder.store(a, stack[-1])
+    stack.append(stack.pop(-2))
 
 
 def rot() -> None:
-    a = builder.load(stack.pop(-3))
-    stack.append(builder.alloca(a.type))
-    builder.store(a, stack[-1])
+    stack.append(stack.pop(-3))
 
 
 def add() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fadd(a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.add(a, b))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def sub() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fsub(a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.sub(a, b))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def mul() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fmul(a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.mul(a, b))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def div() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fdiv(a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.sdiv(a, b))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def mod() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.frem(a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.srem(a, b))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def gt() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack.pop())
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fcmp_ordered(">", a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.icmp_signed(">", a, b))
-    stack.append(builder.alloca(BOOL))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def lt() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack.pop())
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fcmp_ordered("<", a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.icmp_signed("<", a, b))
-    stack.append(builder.alloca(BOOL))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def ge() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack.pop())
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fcmp_ordered(">=", a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.icmp_signed(">=", a, b))
-    stack.append(builder.alloca(BOOL))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def le() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack.pop())
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fcmp_ordered("<=", a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.icmp_signed("<=", a, b))
-    stack.append(builder.alloca(BOOL))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def ne() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack.pop())
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fcmp_ordered("!=", a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.icmp_signed("!=", a, b))
-    stack.append(builder.alloca(BOOL))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def eq() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack.pop())
+    b = stack.pop()
+    a = stack.pop()
     result = (builder.fcmp_ordered("==", a, b)
               if a.type in (FLOAT, DOUBLE)
               else builder.icmp_signed("==", a, b))
-    stack.append(builder.alloca(BOOL))
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def shr() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = builder.lshr(a, b)
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def shl() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = builder.shl(a, b)
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def bor() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = builder.or_(a, b)
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def band() -> None:
-    b = builder.load(stack.pop())
-    a = builder.load(stack[-1])
+    b = stack.pop()
+    a = stack.pop()
     result = builder.and_(a, b)
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 def not_() -> None:
-    a = builder.load(stack[-1])
+    a = stack.pop()
     result = builder.not_(a)
-    builder.store(result, stack[-1])
+    stack.append(result)
 
 
 # NOTE: This operation isn't supposed to be fast. It is a debug-purpose-only operation
 def dump() -> None:
-    result = builder.load(stack.pop())
+    result = stack.pop()
 
     format_str = None
     if result.type == ir.IntType(32):                   # int
-        format_str = const_str(bytearray(b"%d\n"))
+        format_str = global_const(b"%d\n")
     elif result.type == ir.IntType(1):                  # bool
-        format_str = const_str(bytearray(b"%d\n"))
+        format_str = global_const(b"%d\n")
         # needed zero-extending to avoid printing overflows
         # see issue https://github.com/marc-dantas/pile/issues/1
         result = builder.zext(result, ir.IntType(32))
     elif result.type == ir.FloatType():                 # float
-        format_str = const_str(bytearray(b"%f\n"))
+        format_str = global_const(b"%f\n")
         result = builder.fpext(result, ir.DoubleType())
     elif result.type == ir.PointerType(ir.IntType(8)):  # string
-        format_str = const_str(bytearray(b"%s\n"))
+        format_str = global_const(b"%s\n")
     else:
         raise UnreachableError("this point of the code is unreachable at dump operation")
     
@@ -585,6 +644,23 @@ def dump() -> None:
     builder.call(FUNCTIONS["printf"], [format_str, result])
 
 
+COMPILE_OPS: Dict[str, Callable[[], None]] = {
+    "+": add, "-": sub,
+    "*": mul, "/": div,
+    "%": mod, ">": gt,
+    "<": lt, ">=": ge,
+    "<=": le, "!=": ne,
+    "=": eq, "|": bor,
+    "&": band, ">>": shr,
+    "<<": shl, "!": not_, "dup": dup,
+    "drop": drop, "over": over,
+    "rot": rot, "swap": swap,
+    "dump": dump, "if": start_cond,
+    "else": else_cond, "while": start_loop,
+    "do": do_loop,
+}
+
+
 def ret(code: int) -> None:
     builder.ret(ir.Constant(ir.IntType(32), code))
 
@@ -595,18 +671,17 @@ def global_str(value: bytearray, cstr: bool = True) -> ir.GlobalVariable:
     x = ir.Constant(char_arr, x)
     global_var = ir.GlobalVariable(module,
                                    char_arr,
-                                   name=f"{hex(id(value))}")
+                                   name=f".str.{next(GLOBAL_IDS)}")
     global_var.initializer = x
     return global_var
 
 
-def const_str(value: bytearray, cstr: bool = True) -> ir.AllocaInstr:
-    x = value + b'\0' if cstr else value
-    char_arr = ir.ArrayType(ir.IntType(8), len(x))
-    x = ir.Constant(char_arr, x)
-    string = builder.alloca(char_arr)
-    builder.store(x, string)
-    return string
+# String constants are shared by value, so every `dump` of the same
+# type and every repeated literal reuse a single global.
+def global_const(value: bytes) -> ir.GlobalVariable:
+    if value not in CONSTS:
+        CONSTS[value] = global_str(bytearray(value))
+    return CONSTS[value]
 
 
 def indent(file: TextIO,
@@ -635,13 +710,6 @@ def throw(pos: Tuple[str, int, int],
 
 
 def break_line_at(char_pos: int, value: str) -> Iterable[str]:
-    words = value.split()
-    current_line = ''
-    for word in words:
-        if len(current_line) + len(word) + 1 <= char_pos:
-            current_line += f'{word} '
-        else:
-            yield current_line.strip()
-            current_line = f'{word} '
-    if current_line:
-        yield current_line.strip()
+    return textwrap.wrap(value, width=char_pos,
+                         break_long_words=False,
+                         break_on_hyphens=False)